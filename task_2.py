@@ -1,16 +1,43 @@
 """
-Підрахунок частоти слів з URL за допомогою MapReduce + багатопотоковість
+Підрахунок частоти слів з URL за допомогою MapReduce + багатопроцесність:
+текст ділиться на частини, кожна рахується Counter у окремому процесі
 """
 
 import argparse
-import string
-from collections import defaultdict
-from concurrent.futures import ThreadPoolExecutor
-from typing import Dict, Iterable, List, Sequence, Tuple
+import codecs
+import heapq
+import os
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from itertools import chain
+from operator import itemgetter
+from typing import Dict, Iterable, Iterator, List
 
+import charset_normalizer
 import matplotlib.pyplot as plt
 import requests
 
+# Токенізація одним проходом регулярного виразу; RE2 (DFA, лінійний час),
+# якщо встановлено google-re2, інакше стандартний re
+try:
+    import re2 as re
+
+    # У RE2 \w лише ASCII, тому клас задано Unicode-категоріями так, щоб
+    # він збігався з [^\W\d_] стандартного re: літери та нецифрові числові
+    # символи (Nl, No — «Ⅻ», «²»)
+    _TOKEN_RE = re.compile(r"[\pL\p{Nl}\p{No}]+")
+    _BOUNDARY_RE = re.compile(r"[^\pL\p{Nl}\p{No}]")
+except ImportError:
+    import re
+
+    _TOKEN_RE = re.compile(r"[^\W\d_]+")
+    _BOUNDARY_RE = re.compile(r"[\W\d_]")
+
+# Текст, коротший за це, рахується в одному процесі: запуск пулу дорожчий
+_MIN_CHUNK_CHARS = 1 << 20
+# Розмір блоку при потоковому читанні відповіді
+_NET_CHUNK_BYTES = 65536
+
 
 def visualize_top_words(
     word_counts: Dict[str, int], source_url: str, top_n: int = 10
@@ -20,10 +47,11 @@ def visualize_top_words(
         print("Немає даних для візуалізації.")
         return
 
-    top = sorted(word_counts.items(), key=lambda kv: kv[1], reverse=True)[:top_n]
-    labels, values = zip(*top)
-    labels = list(labels)[::-1]
-    values = list(values)[::-1]
+    # O(N log k) замість повного сортування словника
+    top = heapq.nlargest(top_n, word_counts.items(), key=itemgetter(1))
+    top.reverse()
+    labels = [word for word, _ in top]
+    values = [count for _, count in top]
 
     plt.figure(figsize=(10, 6))
     plt.barh(labels, values)
@@ -34,66 +62,162 @@ def visualize_top_words(
     plt.show()
 
 
-def get_text(url: str) -> str | None:
+def _detect_encoding(response: requests.Response, head: bytes) -> str:
+    """
+    Кодування відповіді без chardet-сканування всього тіла (apparent_encoding):
+    оголошене в Content-Type; інакше UTF-8, якщо перший блок ним декодується;
+    інакше — charset_normalizer по першому блоку.
+    """
+    # requests підставляє ISO-8859-1 для text/* без charset — це не оголошення
+    declared = "charset" in response.headers.get("Content-Type", "").lower()
+    if declared and response.encoding:
+        try:
+            return codecs.lookup(response.encoding).name
+        except LookupError:
+            pass
     try:
-        response = requests.get(url, timeout=30)
+        codecs.getincrementaldecoder("utf-8")().decode(head, final=False)
+        return "utf-8"
+    except UnicodeDecodeError:
+        best = charset_normalizer.from_bytes(head).best()
+        return best.encoding if best else "utf-8"
+
+
+def iter_text(url: str, chunk_chars: int = _MIN_CHUNK_CHARS) -> Iterator[str]:
+    """
+    Потоково завантажує текст і віддає частини по ~chunk_chars символів,
+    обрізані по межі слова — будь-якому символу, що не входить у токен
+    (незавершене слово переходить у наступну частину).
+    Підрахунок іде паралельно із завантаженням, весь текст у пам'яті не лежить.
+    Порожнє тіло відповіді — RequestException, як і мережеві помилки.
+    """
+    with requests.get(url, timeout=30, stream=True) as response:
         response.raise_for_status()
-        response.encoding = response.apparent_encoding or response.encoding
-        return response.text
-    except requests.RequestException:
-        return None
 
+        blocks = response.iter_content(chunk_size=_NET_CHUNK_BYTES)
+        head = next(blocks, b"")
+        if not head:
+            # Порожня відповідь — теж помилка отримання тексту
+            raise requests.RequestException("Порожня відповідь", response=response)
+        encoding = _detect_encoding(response, head)
+        decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+
+        pending: List[str] = []
+        size = 0
+        for block in chain((head,), blocks):
+            piece = decoder.decode(block)
+            if size + len(piece) >= chunk_chars:
+                # Межа шукається лише в новому блоці: кожен символ
+                # переглядається й склеюється один раз, навіть коли меж немає
+                cut = _find_boundary(piece, 0 if size else 1)
+                if cut != -1:
+                    pending.append(piece[:cut])
+                    yield "".join(pending)
+                    pending = [piece[cut:]]
+                    size = len(piece) - cut
+                    continue
+            pending.append(piece)
+            size += len(piece)
 
-# Функція для видалення знаків пунктуації
-def remove_punctuation(text: str) -> str:
-    return text.translate(str.maketrans("", "", string.punctuation))
+        pending.append(decoder.decode(b"", final=True))
+        tail = "".join(pending)
+        if tail:
+            yield tail
 
 
-def map_function(word: str) -> Tuple[str, int]:
-    return word, 1
+def _find_boundary(text: str, pos: int = 0) -> int:
+    """
+    Індекс першого символу з pos, що не може бути частиною слова
+    (пробільний, розділовий, цифра), або -1. Розріз тут не ділить токен.
+    """
+    m = _BOUNDARY_RE.search(text, pos)
+    return m.start() if m else -1
 
 
-def shuffle_function(
-    mapped_values: Sequence[Tuple[str, int]],
-) -> Iterable[Tuple[str, List[int]]]:
-    shuffled: Dict[str, List[int]] = defaultdict(list)
-    for key, value in mapped_values:
-        shuffled[key].append(value)
-    return shuffled.items()
+def _split_at_boundary(text: str, n: int) -> List[str]:
+    """Ділить текст на ~n частин; кожна межа зсувається до наступної межі слова."""
+    size = -(-len(text) // n)
+    chunks: List[str] = []
+    start = 0
+    while start < len(text):
+        end = _find_boundary(text, start + size)
+        if end == -1:
+            end = len(text)
+        chunks.append(text[start:end])
+        start = end
+    return chunks
 
 
-def reduce_function(key_values: Tuple[str, List[int]]) -> Tuple[str, int]:
-    key, values = key_values
-    return key, sum(values)
+# Map: слова (послідовності літер) у нижньому регістрі й підрахунок частини.
+# Фільтр wanted застосовується тут же, щоб не зливати зайві ключі
+def _count_chunk(chunk: str, wanted: frozenset[str] | None = None) -> Counter[str]:
+    words = _TOKEN_RE.findall(chunk.lower())
+    if wanted is None:
+        return Counter(words)
+    return Counter(w for w in words if w in wanted)
+
+
+# Reduce: злиття двох часткових лічильників (менший вливається в більший)
+def _merge(a: Counter[str], b: Counter[str]) -> Counter[str]:
+    if len(a) < len(b):
+        a, b = b, a
+    a.update(b)
+    return a
 
 
 # Виконання MapReduce
 def map_reduce(
-    text: str,
+    text: str | Iterable[str],
     search_words: Iterable[str] | None = None,
     max_workers: int | None = None,
 ) -> Dict[str, int]:
-    # 0) нормалізація: нижній регістр + прибрати пунктуацію
-    text = remove_punctuation(text.lower())
-    words = text.split()
+    """
+    text — або цілий рядок, або потік частин, обрізаних по межі слова
+    (наприклад, з iter_text).
+    """
+    workers = max_workers or os.cpu_count() or 1
 
-    # Якщо задано список слів — фільтруємо (регістр уже зведено)
-    if search_words:
-        wanted = set(w.lower() for w in search_words)
-        words = [word for word in words if word in wanted]
+    # Якщо задано список слів — рахуємо лише їх (регістр уже зведено)
+    wanted = frozenset(w.lower() for w in search_words) if search_words else None
 
-    # Крок 1: Паралельний Мапінг
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        mapped_values = list(executor.map(map_function, words))
+    chunks: Iterable[str]
+    if isinstance(text, str):
+        workers = max(1, min(workers, len(text) // _MIN_CHUNK_CHARS))
+        chunks = _split_at_boundary(text, workers) if workers > 1 else [text]
+    else:
+        # Одна частина — пул не потрібен
+        it = iter(text)
+        head = [c for c in (next(it, None), next(it, None)) if c is not None]
+        if len(head) < 2:
+            workers = 1
+        chunks = chain(head, it)
 
-    # Крок 2: Shuffle
-    shuffled_values = shuffle_function(mapped_values)
+    counts: Counter[str] = Counter()
+    if workers == 1:
+        for chunk in chunks:
+            counts.update(_count_chunk(chunk, wanted))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            # Крок 1: Паралельний Мапінг — частини рахуються в окремих процесах
+            pending: set[Future[Counter[str]]] = {
+                executor.submit(_count_chunk, chunk, wanted) for chunk in chunks
+            }
+            # Крок 2: Редукція деревом — готові пари зливаються теж у пулі,
+            # паралельно з рештою мапінгу; остання пара — в цьому процесі
+            ready: List[Counter[str]] = []
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                ready.extend(f.result() for f in done)
+                while len(ready) >= 2:
+                    a, b = ready.pop(), ready.pop()
+                    if pending or ready:
+                        pending.add(executor.submit(_merge, a, b))
+                    else:
+                        ready.append(_merge(a, b))
+            if ready:
+                counts = ready[0]
 
-    # Крок 3: Паралельна Редукція
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        reduced_values = list(executor.map(reduce_function, shuffled_values))
-
-    return dict(reduced_values)
+    return counts
 
 
 def parse_args() -> argparse.Namespace:
@@ -118,7 +242,7 @@ def parse_args() -> argparse.Namespace:
         "-w",
         type=int,
         default=None,
-        help="Кількість потоків для map/reduce (default: авто)",
+        help="Кількість процесів для map/reduce (default: кількість CPU)",
     )
     parser.add_argument(
         "--search",
@@ -133,14 +257,15 @@ def parse_args() -> argparse.Namespace:
 if __name__ == "__main__":
     args = parse_args()
 
-    text = get_text(args.url)
-    if not text:
+    # Виконання MapReduce на тексті, що завантажується потоково
+    try:
+        result = map_reduce(
+            iter_text(args.url), search_words=args.search, max_workers=args.workers
+        )
+    except requests.RequestException:
         print("Помилка: Не вдалося отримати вхідний текст.")
         raise SystemExit(1)
 
-    # Виконання MapReduce на вхідному тексті
-    result = map_reduce(text, search_words=args.search, max_workers=args.workers)
-
     print("Унікальних слів:", len(result))
     if args.search:
         print(